@@ -1,22 +1,35 @@
 import json
 import asyncio
-from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+import math
+import time
+from datetime import datetime
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple, Union, IO
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import attrgetter, itemgetter
 import io
 import logging
+import tempfile
+import threading
 
 from pydantic import BaseModel, Field, HttpUrl
 from fastapi import FastAPI, HTTPException, Security, Header
+from fastapi.responses import ORJSONResponse
 from fastapi.security import APIKeyHeader
 import httpx
+import numpy as np
+from numba import njit
+import orjson
 import os
 from dotenv import load_dotenv
 
 # Google API Imports
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaInMemoryUpload
+from googleapiclient.http import HttpRequest, MediaIoBaseUpload, build_http
+import google_auth_httplib2
+import httplib2
 from googleapiclient.errors import HttpError as GoogleHttpError
 import gspread
 
@@ -27,9 +40,41 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 app = FastAPI(
     title="Douyin Virality Analysis API",
     description="A four-step API to discover, analyze, and download top viral videos.",
-    version="3.0.0"
+    version="3.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# --- Shared HTTP Client ---
+# A single pooled client is reused across requests so upstream TCP/TLS connections stay alive.
+HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+# --- Drive Upload Executor ---
+# Drive uploads can run for minutes, so they get their own threads instead of the default
+# executor, which stays free for the short Sheets calls made through asyncio.to_thread.
+MAX_CONCURRENT_DOWNLOADS = 6
+UPLOAD_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+@app.on_event("startup")
+async def startup_http_client():
+    """Creates the shared, connection-pooled HTTP client and the Drive upload executor."""
+    global HTTP_CLIENT, UPLOAD_EXECUTOR
+    # HTTP/2 multiplexes the concurrent RapidAPI calls over a few connections. The 300s default
+    # covers the synchronous Apify scrape; other calls pass their own shorter timeouts.
+    HTTP_CLIENT = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(300.0, connect=10.0),
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60)
+    )
+    UPLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DOWNLOADS, thread_name_prefix="drive-upload")
+
+@app.on_event("shutdown")
+async def shutdown_http_client():
+    """Closes the shared HTTP client and its pooled connections, and stops the upload executor."""
+    if HTTP_CLIENT is not None:
+        await HTTP_CLIENT.aclose()
+    if UPLOAD_EXECUTOR is not None:
+        UPLOAD_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
 API_KEY = os.getenv("API_KEY_SECRET")
 API_KEY_NAME = "x-api-key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=True)
@@ -43,15 +88,34 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
     raise HTTPException(status_code=401, detail="Invalid or missing API Key.")
 
 # --- Google Drive Service Initialization ---
+@lru_cache(maxsize=1)
+def _build_drive_service():
+    """Builds the authenticated Google Drive API service object once per process."""
+    credentials_path = os.getenv("GOOGLE_CREDENTIALS_PATH")
+    if not credentials_path or not os.path.exists(credentials_path):
+        raise FileNotFoundError("Google credentials file not found or path is incorrect.")
+    scopes = ['https://www.googleapis.com/auth/drive.file']
+    creds = Credentials.from_service_account_file(credentials_path, scopes=scopes)
+
+    # httplib2 is not thread-safe, so each worker thread gets its own authorized transport.
+    # build_http() keeps the client's defaults: a socket timeout and 308 not treated as a
+    # redirect, which resumable uploads rely on for "Resume Incomplete" responses.
+    # This lets uploads run concurrently against the same service object, while requests
+    # issued from the same thread reuse its keep-alive connection to googleapis.com.
+    thread_local = threading.local()
+
+    def build_request(http, *args, **kwargs):
+        if not hasattr(thread_local, 'http'):
+            thread_local.http = google_auth_httplib2.AuthorizedHttp(creds, http=build_http())
+        return HttpRequest(thread_local.http, *args, **kwargs)
+
+    authorized_http = google_auth_httplib2.AuthorizedHttp(creds, http=build_http())
+    return build('drive', 'v3', requestBuilder=build_request, http=authorized_http, cache_discovery=False)
+
 def get_drive_service():
-    """Builds and returns an authenticated Google Drive API service object."""
+    """Returns the shared, authenticated Google Drive API service object."""
     try:
-        credentials_path = os.getenv("GOOGLE_CREDENTIALS_PATH")
-        if not credentials_path or not os.path.exists(credentials_path):
-            raise FileNotFoundError("Google credentials file not found or path is incorrect.")
-        scopes = ['https://www.googleapis.com/auth/drive.file']
-        creds = Credentials.from_service_account_file(credentials_path, scopes=scopes)
-        return build('drive', 'v3', credentials=creds, cache_discovery=False)
+        return _build_drive_service()
     except Exception as e:
         logging.error(f"[Drive Init] Failed to build Google Drive service: {e}")
         raise HTTPException(status_code=500, detail="Could not initialize Google Drive service.")
@@ -77,35 +141,95 @@ def create_drive_folder(service, folder_name: str, parent_folder_id: str) -> Dic
         raise HTTPException(status_code=error.resp.status, detail=f"Failed to create Google Drive folder: {error}")
 
 # --- Google Drive File Upload (Corrected with Shared Drive support) ---
-def upload_data_to_drive(service, data: bytes, filename: str, folder_id: str, mimetype: str) -> str:
-    """Uploads in-memory data to a specific folder in Google Drive with Shared Drive support."""
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Resumable upload chunk size; must be a multiple of 256 KB
+
+def upload_data_to_drive(service, data: Union[bytes, IO[bytes]], filename: str, folder_id: str, mimetype: str) -> str:
+    """Uploads bytes or a binary file object to a specific folder in Google Drive with Shared Drive support.
+
+    The upload is resumable and sent in chunks, so only one chunk is held in memory at a time.
+    """
     try:
-        media = MediaInMemoryUpload(data, mimetype=mimetype, resumable=True)
+        fd = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+        media = MediaIoBaseUpload(fd, mimetype=mimetype, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
         file_metadata = {'name': filename, 'parents': [folder_id]}
-        file = service.files().create(
+        upload_request = service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id, webViewLink',
             supportsAllDrives=True
-        ).execute()
-        success_link = file.get('webViewLink')
+        )
+        response = None
+        while response is None:
+            _, response = upload_request.next_chunk()
+        success_link = response.get('webViewLink')
         logging.info(f"Successfully uploaded '{filename}'. Drive link: {success_link}")
         return success_link
-    except GoogleHttpError as error:
+    except (GoogleHttpError, httplib2.HttpLib2Error, OSError) as error:
+        # Chunked uploads also surface transport errors (e.g. socket timeouts) between chunks
         logging.error(f"Google Drive upload failed for file '{filename}'. Reason: {error}")
         raise Exception(f"An error occurred during Google Drive upload: {error}")
 
+@lru_cache(maxsize=1)
+def _build_gspread_client():
+    """Builds the gspread client object once per process."""
+    credentials_path = os.getenv("GOOGLE_CREDENTIALS_PATH")
+    if not credentials_path or not os.path.exists(credentials_path):
+        raise FileNotFoundError("Google credentials file not found.")
+    return gspread.service_account(filename=credentials_path)
+
 def get_gspread_client():
-    """Builds and returns a gspread client object."""
+    """Returns the shared gspread client object."""
     try:
-        credentials_path = os.getenv("GOOGLE_CREDENTIALS_PATH")
-        if not credentials_path or not os.path.exists(credentials_path):
-            raise FileNotFoundError("Google credentials file not found.")
-        return gspread.service_account(filename=credentials_path)
+        return _build_gspread_client()
     except Exception as e:
         logging.error(f"[Gspread Init] Failed to build client: {e}")
         raise HTTPException(status_code=500, detail="Could not initialize Google Sheets client.")
 
+@lru_cache(maxsize=32)
+def open_spreadsheet(spreadsheet_id: str) -> gspread.Spreadsheet:
+    """Opens a spreadsheet by ID, reusing the handle for the life of the process."""
+    return get_gspread_client().open_by_key(spreadsheet_id)
+
+def build_column_ranges(col: int, updates: List[Tuple[int, Any]]) -> List[Dict[str, Any]]:
+    """Groups (row, value) updates for one column into batch_update entries, one per run of adjacent rows."""
+    col_letter = gspread.utils.rowcol_to_a1(1, col).rstrip('1')
+    ranges = []
+    run_start, run_values, previous_row = None, [], None
+    for row, value in sorted(updates, key=lambda update: update[0]):
+        if previous_row is not None and row != previous_row + 1:
+            ranges.append({"range": f"{col_letter}{run_start}:{col_letter}{previous_row}", "values": run_values})
+            run_start, run_values = None, []
+        if run_start is None:
+            run_start = row
+        run_values.append([value])
+        previous_row = row
+    if run_values:
+        ranges.append({"range": f"{col_letter}{run_start}:{col_letter}{previous_row}", "values": run_values})
+    return ranges
+
+# --- Virality Scoring Kernel ---
+@njit(cache=True, fastmath=True)
+def virality_scores(digg, comment, share, collect, recommend, create_time, now, w1, w2, follower_log):
+    """Computes W1 * Virality Velocity + W2 * Engagement-to-Follower Ratio for each video.
+
+    Takes flat float64 arrays of per-video stats. With w1=1 and w2=0 it returns the plain
+    Virality Velocity used to rank creators in phase 1.
+    """
+    n = digg.shape[0]
+    out = np.empty(n)
+    for i in range(n):
+        age = max(1.0, (now - create_time[i]) / 3600.0)
+        velocity = (0.5 * digg[i] + 1.5 * comment[i] + 2.0 * share[i] + 1.0 * collect[i]) / age
+        engagement = 0.3 * digg[i] + 1.8 * comment[i] + 2.5 * share[i] + 1.2 * collect[i] + 3.0 * recommend[i]
+        out[i] = w1 * velocity + w2 * engagement / follower_log
+    return out
+
+@app.on_event("startup")
+async def warm_up_virality_kernel():
+    """Compiles the scoring kernel up front so the first request doesn't pay the JIT cost."""
+    dummy = np.zeros(1)
+    virality_scores(dummy, dummy, dummy, dummy, dummy, dummy, 0.0, 1.0, 0.0, 1.0)
+
 # --- Pydantic Models for the Request and Response ---
 
 class DiscoverAndSaveRequest(BaseModel):
@@ -120,6 +244,18 @@ class DiscoverAndSaveResponse(BaseModel):
     new_creators_added: int
     top_ranked_sec_uids: List[str] = Field(..., description="The ranked list of secUids identified in this run.")
 
+class ScrapedVideo(NamedTuple):
+    """The fields of an Apify scrape item used to rank creators."""
+    digg_count: int
+    comment_count: int
+    share_count: int
+    collect_count: int
+    create_time: int
+    author_meta: Dict[str, Any]
+
+# Header row written when the creator sheet is created
+CREATOR_SHEET_HEADERS = ['Creator Name', 'Creator SecUid', 'Account Link', 'Follower Count']
+
 # --- Corrected API Endpoint ---
 
 @app.post("/discover_and_save_creators", response_model=DiscoverAndSaveResponse)
@@ -134,82 +270,125 @@ async def discover_and_save_creators(request: DiscoverAndSaveRequest):
         raise HTTPException(status_code=500, detail="APIFY_TOKEN not configured.")
 
     # Step 1: Discover Videos via Apify
-    async with httpx.AsyncClient(timeout=300.0) as client:
-        logging.info(f"Starting Apify scrape for terms: {request.search_terms}")
-        api_params = {"token": apify_token}
-        api_payload = {
-            "searchTermsOrHashtags": request.search_terms,
-            "maxItemsPerUrl": request.max_videos_per_term
-        }
-        
-        try:
-            response = await client.post(APIFY_API_URL, params=api_params, json=api_payload)
-            response.raise_for_status()  # This will raise an exception for 4xx or 5xx status codes
-            scraped_data = response.json()
-        except httpx.HTTPStatusError as e:
-            # Provide a more detailed error message if the API call fails
-            logging.error(f"Apify API request failed with status {e.response.status_code}: {e.response.text}")
-            raise HTTPException(
-                status_code=502, # Bad Gateway: indicates an issue with an upstream server
-                detail=f"Failed to fetch data from Apify API. Status: {e.response.status_code}. Please check your token and Apify account status."
-            )
-        except Exception as e:
-            logging.error(f"An unexpected error occurred during Apify request: {e}")
-            raise HTTPException(status_code=500, detail="An unexpected server error occurred.")
+    client = HTTP_CLIENT
+    logging.info(f"Starting Apify scrape for terms: {request.search_terms}")
+    api_params = {"token": apify_token}
+    api_payload = {
+        "searchTermsOrHashtags": request.search_terms,
+        "maxItemsPerUrl": request.max_videos_per_term
+    }
+    
+    try:
+        response = await client.post(APIFY_API_URL, params=api_params, json=api_payload)
+        response.raise_for_status()  # This will raise an exception for 4xx or 5xx status codes
+        raw_items = orjson.loads(response.content)
+    except httpx.HTTPStatusError as e:
+        # Provide a more detailed error message if the API call fails
+        logging.error(f"Apify API request failed with status {e.response.status_code}: {e.response.text}")
+        raise HTTPException(
+            status_code=502, # Bad Gateway: indicates an issue with an upstream server
+            detail=f"Failed to fetch data from Apify API. Status: {e.response.status_code}. Please check your token and Apify account status."
+        )
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during Apify request: {e}")
+        raise HTTPException(status_code=500, detail="An unexpected server error occurred.")
 
     # Step 2: Calculate Virality Velocity for all videos
+    current_time_ts = int(time.time())
+
+    # Keep only the fields used below and drop the full payload so the rest of each item can be reclaimed
+    scraped_data = [
+        ScrapedVideo(
+            digg_count=stats.get('diggCount', 0),
+            comment_count=stats.get('commentCount', 0),
+            share_count=stats.get('shareCount', 0),
+            collect_count=stats.get('collectCount', 0),
+            create_time=video.get('createTime', current_time_ts),
+            author_meta=video.get('authorMeta', {})
+        )
+        for video in raw_items
+        for stats in (video.get('statistics', {}),)
+    ]
+    del raw_items, response
+
     logging.info(f"Calculating Virality Velocity for {len(scraped_data)} videos...")
-    video_velocities = []
-    current_time_ts = int(datetime.now(timezone.utc).timestamp())
+    num_videos = len(scraped_data)
 
-    for video in scraped_data:
-        stats = video.get('statistics', {})
-        create_time = video.get('createTime', current_time_ts)
-        video_age_in_hours = max(1, (current_time_ts - create_time) / 3600)
-        
-        weighted_engagement = (
-            stats.get('diggCount', 0) * 0.5 +
-            stats.get('commentCount', 0) * 1.5 +
-            stats.get('shareCount', 0) * 2.0 +
-            stats.get('collectCount', 0) * 1.0
-        )
-        virality_velocity = weighted_engagement / video_age_in_hours
-        
-        video_velocities.append({
-            "authorMeta": video.get('authorMeta', {}),
-            "velocity": virality_velocity
-        })
+    def column(field: str) -> np.ndarray:
+        get_field = attrgetter(field)
+        return np.fromiter((get_field(video) for video in scraped_data), dtype=np.float64, count=num_videos)
+
+    digg = column('digg_count')
+    comment = column('comment_count')
+    share = column('share_count')
+    collect = column('collect_count')
+    create = column('create_time')
+
+    velocities = virality_scores(digg, comment, share, collect, np.zeros(num_videos), create, float(current_time_ts), 1.0, 0.0, 1.0)
 
     # Step 3: Identify Top Creators from the most viral videos
-    video_velocities.sort(key=lambda v: v['velocity'], reverse=True)
-    top_creators_data = []
-    seen_uids = set()
-    for video in video_velocities:
-        author_meta = video.get('authorMeta', {})
-        secUid = author_meta.get('secUid')
-        if secUid and secUid not in seen_uids:
-            top_creators_data.append(author_meta)
-            seen_uids.add(secUid)
-            if len(top_creators_data) >= request.top_creators_to_rank:
-                break
+    def ranked_indices(k: int) -> np.ndarray:
+        """Returns the indices of the k highest-velocity videos, highest first, without a full sort.
+
+        Every video tied with the k-th velocity is kept, and ties stay in scrape order, so the
+        result is a prefix of a stable full sort by descending velocity.
+        """
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        if k >= num_videos:
+            return np.argsort(-velocities, kind='stable')
+        kth = np.partition(velocities, num_videos - k)[num_videos - k]
+        top_idx = np.flatnonzero(velocities >= kth)
+        return top_idx[np.argsort(-velocities[top_idx], kind='stable')]
+
+    def collect_top_creators(indices: np.ndarray) -> List[Dict[str, Any]]:
+        creators = []
+        seen_uids = set()
+        for i in indices:
+            author_meta = scraped_data[i].author_meta
+            secUid = author_meta.get('secUid')
+            if secUid and secUid not in seen_uids:
+                creators.append(author_meta)
+                seen_uids.add(secUid)
+                if len(creators) >= request.top_creators_to_rank:
+                    break
+        return creators
+
+    # Oversample the candidate pool since the same author often owns several of the top videos
+    CANDIDATE_OVERSAMPLE = 5
+    candidate_pool_size = request.top_creators_to_rank * CANDIDATE_OVERSAMPLE
+    top_creators_data = collect_top_creators(ranked_indices(candidate_pool_size))
+    if len(top_creators_data) < request.top_creators_to_rank and candidate_pool_size < num_videos:
+        # Deduplication exhausted the candidate pool; fall back to ranking every video
+        top_creators_data = collect_top_creators(ranked_indices(num_videos))
     
     # Step 4: Connect to Google Sheets and update with new creators
     try:
-        gc = get_gspread_client()
-        spreadsheet = gc.open_by_key(request.spreadsheet_id)
+        spreadsheet = await asyncio.to_thread(open_spreadsheet, request.spreadsheet_id)
 
         try:
-            worksheet = spreadsheet.worksheet(request.sheet_name)
+            worksheet = await asyncio.to_thread(spreadsheet.worksheet, request.sheet_name)
             logging.info(f"Found existing sheet named '{request.sheet_name}'.")
+
+            # Read only the SecUid column rather than the whole sheet. Sheets created here keep it
+            # at a fixed position, so one ranged read normally suffices; the header row is only
+            # looked up when the sheet uses a different layout.
+            secuid_col_letter = gspread.utils.rowcol_to_a1(1, CREATOR_SHEET_HEADERS.index('Creator SecUid') + 1).rstrip('1')
+            column_range = await asyncio.to_thread(worksheet.get, f"{secuid_col_letter}:{secuid_col_letter}", major_dimension=gspread.utils.Dimension.cols)
+            secuid_values = column_range[0] if column_range else []
+            if not secuid_values or secuid_values[0] != 'Creator SecUid':
+                headers = await asyncio.to_thread(worksheet.row_values, 1)
+                if 'Creator SecUid' not in headers:
+                    raise HTTPException(status_code=400, detail=f"Sheet '{request.sheet_name}' is missing the 'Creator SecUid' column.")
+                secuid_values = await asyncio.to_thread(worksheet.col_values, headers.index('Creator SecUid') + 1)
+            existing_secuids = set(secuid_values[1:])
         except gspread.exceptions.WorksheetNotFound:
             logging.info(f"Sheet '{request.sheet_name}' not found. Creating it...")
-            headers = ['Creator Name', 'Creator SecUid', 'Account Link', 'Follower Count']
-            worksheet = spreadsheet.add_worksheet(title=request.sheet_name, rows=1, cols=len(headers))
-            worksheet.append_row(headers)
+            worksheet = await asyncio.to_thread(spreadsheet.add_worksheet, title=request.sheet_name, rows=1, cols=len(CREATOR_SHEET_HEADERS))
+            await asyncio.to_thread(worksheet.append_row, CREATOR_SHEET_HEADERS)
             logging.info(f"Sheet '{request.sheet_name}' created with headers.")
+            existing_secuids = set()
 
-        existing_records = worksheet.get_all_records()
-        existing_secuids = {str(row.get('Creator SecUid')) for row in existing_records}
         logging.info(f"Found {len(existing_secuids)} existing creators in the sheet.")
 
         rows_to_append = []
@@ -225,11 +404,13 @@ async def discover_and_save_creators(request: DiscoverAndSaveRequest):
                 logging.info(f"Creator with SecUid '{secUid}' already exists. Skipping.")
 
         if rows_to_append:
-            worksheet.append_rows(rows_to_append, value_input_option='USER_ENTERED')
+            await asyncio.to_thread(worksheet.append_rows, rows_to_append, value_input_option='USER_ENTERED')
             logging.info(f"Successfully appended {len(rows_to_append)} new rows to '{request.sheet_name}'.")
         else:
             logging.info("No new creators to append.")
 
+    except HTTPException:
+        raise
     except gspread.exceptions.APIError as e:
         logging.error(f"A Google Sheets API error occurred: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while interacting with Google Sheets.")
@@ -274,10 +455,9 @@ async def update_follower_counts(request: UpdateFollowersRequest):
 
     # Step 1: Read all data from the specified Google Sheet
     try:
-        gc = get_gspread_client()
-        spreadsheet = gc.open_by_key(request.spreadsheet_id)
-        worksheet = spreadsheet.worksheet(request.sheet_name)
-        all_rows = worksheet.get_all_values() # Get as a list of lists to preserve row numbers
+        spreadsheet = await asyncio.to_thread(open_spreadsheet, request.spreadsheet_id)
+        worksheet = await asyncio.to_thread(spreadsheet.worksheet, request.sheet_name)
+        all_rows = await asyncio.to_thread(worksheet.get_all_values) # Get as a list of lists to preserve row numbers
     except gspread.exceptions.SpreadsheetNotFound:
         raise HTTPException(status_code=404, detail=f"Spreadsheet with ID '{request.spreadsheet_id}' not found.")
     except gspread.exceptions.WorksheetNotFound:
@@ -314,34 +494,56 @@ async def update_follower_counts(request: UpdateFollowersRequest):
     users_failed = 0
     updates_to_batch = []
 
-    async with httpx.AsyncClient() as client:
-        for creator in creators_to_update:
-            sec_id = creator["sec_uid"]
-            payload = {"sec_user_id": sec_id}
-            try:
-                response = await client.post(USER_DETAIL_URL, json=payload, headers=douyin_media_headers, timeout=30)
-                if response.status_code == 200:
-                    user_data = response.json().get("user", {})
-                    follower_count = user_data.get("follower_count")
-                    if follower_count is not None:
-                        # Prepare the update for batch operation
-                        cell_to_update = gspread.cell.Cell(row=creator["row_num"], col=follower_col_index + 1, value=follower_count)
-                        updates_to_batch.append(cell_to_update)
-                        logging.info(f"Successfully fetched follower count for {sec_id}: {follower_count}")
-                    else:
-                        users_failed += 1
-                        logging.warning(f"API response for {sec_id} did not contain a follower count.")
+    MAX_CONCURRENT_REQUESTS = 10
+
+    async def fetch_one(creator: Dict[str, Any], client: httpx.AsyncClient, sem: asyncio.Semaphore):
+        """Fetches the user detail for a single creator, bounded by the shared semaphore."""
+        async with sem:
+            payload = {"sec_user_id": creator["sec_uid"]}
+            response = await client.post(USER_DETAIL_URL, json=payload, headers=douyin_media_headers, timeout=30)
+            return creator, response
+
+    client = HTTP_CLIENT
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    results = await asyncio.gather(
+        *(fetch_one(creator, client, sem) for creator in creators_to_update),
+        return_exceptions=True
+    )
+
+    for creator, result in zip(creators_to_update, results):
+        sec_id = creator["sec_uid"]
+        if isinstance(result, Exception):
+            users_failed += 1
+            logging.error(f"An exception occurred while fetching data for {sec_id}: {result}")
+            continue
+
+        _, response = result
+        try:
+            if response.status_code == 200:
+                user_data = orjson.loads(response.content).get("user", {})
+                follower_count = user_data.get("follower_count")
+                if follower_count is not None:
+                    # Prepare the update for batch operation
+                    updates_to_batch.append((creator["row_num"], follower_count))
+                    logging.info(f"Successfully fetched follower count for {sec_id}: {follower_count}")
                 else:
                     users_failed += 1
-                    logging.error(f"Failed to fetch data for {sec_id}. Status: {response.status_code}, Response: {response.text}")
-            except Exception as e:
+                    logging.warning(f"API response for {sec_id} did not contain a follower count.")
+            else:
                 users_failed += 1
-                logging.error(f"An exception occurred while fetching data for {sec_id}: {e}")
+                logging.error(f"Failed to fetch data for {sec_id}. Status: {response.status_code}, Response: {response.text}")
+        except Exception as e:
+            users_failed += 1
+            logging.error(f"An exception occurred while fetching data for {sec_id}: {e}")
 
     # Step 4: Batch update the Google Sheet with the new follower counts
     if updates_to_batch:
         try:
-            worksheet.update_cells(updates_to_batch, value_input_option='USER_ENTERED')
+            await asyncio.to_thread(
+                worksheet.batch_update,
+                build_column_ranges(follower_col_index + 1, updates_to_batch),
+                value_input_option='USER_ENTERED'
+            )
             logging.info(f"Successfully updated {len(updates_to_batch)} users in the spreadsheet.")
         except Exception as e:
             logging.error(f"Failed to batch update Google Sheet: {e}")
@@ -366,6 +568,14 @@ class AnalyzeAndReportResponse(BaseModel):
     videos_processed: int
     report_sheet_url: str
 
+# Column order of the generated report sheet; report rows are built as lists in this order
+REPORT_HEADERS = (
+    "Creator Name", "Creator SecUid", "Account Link", "Follower Count", "Video ID", "Video URL",
+    "Description", "Create Timestamp", "Create Date", "Likes", "Comments", "Shares", "Bookmarks",
+    "Recommendations", "Virality Score"
+)
+SCORE_COL = REPORT_HEADERS.index("Virality Score")
+
 # --- API Endpoint ---
 
 @app.post("/analyze_and_generate_report", response_model=AnalyzeAndReportResponse)
@@ -384,11 +594,10 @@ async def analyze_and_generate_report(request: AnalyzeAndReportRequest):
 
     # Step 1: Read creator data from the source Google Sheet
     try:
-        gc = get_gspread_client()
-        spreadsheet = gc.open_by_key(request.spreadsheet_id)
-        worksheet = spreadsheet.worksheet(request.sheet_name)
-        # Use get_all_records to work with dictionaries, which is more robust
-        all_users = worksheet.get_all_records()
+        spreadsheet = await asyncio.to_thread(open_spreadsheet, request.spreadsheet_id)
+        worksheet = await asyncio.to_thread(spreadsheet.worksheet, request.sheet_name)
+        # A single values fetch; columns are looked up by header position below
+        all_rows = await asyncio.to_thread(worksheet.get_all_values)
     except gspread.exceptions.SpreadsheetNotFound:
         raise HTTPException(status_code=404, detail=f"Spreadsheet with ID '{request.spreadsheet_id}' not found.")
     except gspread.exceptions.WorksheetNotFound:
@@ -396,95 +605,132 @@ async def analyze_and_generate_report(request: AnalyzeAndReportRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred while accessing the Google Sheet: {e}")
 
-    if not all_users:
+    if len(all_rows) < 2:
         raise HTTPException(status_code=404, detail="The source sheet contains no user data.")
 
+    headers = all_rows[0]
+    try:
+        secuid_col_index = headers.index('Creator SecUid')
+        follower_col_index = headers.index('Follower Count')
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Missing required column in sheet: {e}. Please ensure 'Creator SecUid' and 'Follower Count' columns exist.")
+    name_col_index = headers.index('Creator Name') if 'Creator Name' in headers else None
+    link_col_index = headers.index('Account Link') if 'Account Link' in headers else None
+
+    def cell_value(row: List[str], col_index: Optional[int]) -> str:
+        return row[col_index] if col_index is not None and col_index < len(row) else ''
+
     # Step 2: Select the last N users to process
-    users_to_process = all_users[-MAX_USERS_TO_PROCESS:]
+    users_to_process = all_rows[1:][-MAX_USERS_TO_PROCESS:]
     logging.info(f"Selected the last {len(users_to_process)} users for analysis.")
 
     # Step 3: Fetch videos and calculate virality for each user
     all_video_reports = []
-    current_time_ts = int(datetime.now(timezone.utc).timestamp())
-
-    async with httpx.AsyncClient(timeout=300.0) as client:
-        for user in users_to_process:
-            sec_uid = user.get('Creator SecUid')
-            follower_count = int(user.get('Follower Count', 0))
+    current_time_ts = int(time.time())
 
-            if not sec_uid or not follower_count > 0:
-                logging.warning(f"Skipping user '{user.get('Creator Name')}' due to missing SecUid or follower count.")
-                continue
+    MAX_CONCURRENT_REQUESTS = 8
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 
-            logging.info(f"Processing user: {user.get('Creator Name')} ({sec_uid})")
+    async def fetch_user(client: httpx.AsyncClient, creator_name: str, sec_uid: str) -> List[Dict[str, Any]]:
+        """Fetches the most recent videos for a single user, bounded by the shared semaphore."""
+        async with sem:
+            logging.info(f"Processing user: {creator_name} ({sec_uid})")
             payload = {"sec_user_id": sec_uid, "count": VIDEOS_PER_USER, "max_cursor": "0"}
-            
-            try:
-                response = await client.post(RECENT_VIDEOS_URL, json=payload, headers=douyin_media_headers)
-                response.raise_for_status()
-                videos = response.json().get('aweme_list', [])
-
-                for video in videos:
-                    stats = video.get('statistics', {})
-                    digg_count = stats.get('digg_count', 0)
-                    comment_count = stats.get('comment_count', 0)
-                    share_count = stats.get('share_count', 0)
-                    collect_count = stats.get('collect_count', 0)
-                    recommend_count = stats.get('recommend_count', 0)
-                    create_time = video.get('create_time', current_time_ts)
-                    video_id = video.get('aweme_id')
-
-                    # --- Virality Score Calculation ---
-                    # 1. Virality Velocity (from phase 1 logic)
-                    video_age_in_hours = max(1, (current_time_ts - create_time) / 3600)
-                    weighted_engagement = (digg_count * 0.5) + (comment_count * 1.5) + (share_count * 2.0) + (collect_count * 1.0)
-                    virality_velocity = weighted_engagement / video_age_in_hours
-
-                    # 2. Detailed Engagement & Ratio
-                    detailed_engagement_score = (digg_count * 0.3) + (comment_count * 1.8) + (share_count * 2.5) + (collect_count * 1.2) + (recommend_count * 3.0)
-                    engagement_to_follower_ratio = detailed_engagement_score / math.log(follower_count + 1)
-                    
-                    # 3. Final Weighted Score
-                    final_virality_score = (W1 * virality_velocity) + (W2 * engagement_to_follower_ratio)
-                    
-                    # --- Prepare data for the report row ---
-                    report_row = {
-                        "Creator Name": user.get('Creator Name'),
-                        "Creator SecUid": sec_uid,
-                        "Account Link": user.get('Account Link'),
-                        "Follower Count": follower_count,
-                        "Video ID": video_id,
-                        "Video URL": f"https://www.douyin.com/video/{video_id}",
-                        "Description": video.get('desc'),
-                        "Create Timestamp": create_time,
-                        "Create Date": datetime.fromtimestamp(create_time, tz=timezone.utc).strftime('%Y-%m-%d'),
-                        "Likes": digg_count,
-                        "Comments": comment_count,
-                        "Shares": share_count,
-                        "Bookmarks": collect_count,
-                        "Recommendations": recommend_count,
-                        "Virality Score": round(final_virality_score, 4)
-                    }
-                    all_video_reports.append(report_row)
-            except Exception as e:
-                logging.error(f"Failed to process videos for user {sec_uid}: {e}")
+            response = await client.post(RECENT_VIDEOS_URL, json=payload, headers=douyin_media_headers)
+            response.raise_for_status()
+            return orjson.loads(response.content).get('aweme_list', [])
+
+    users_to_fetch = []
+    for row in users_to_process:
+        creator_name = cell_value(row, name_col_index)
+        sec_uid = cell_value(row, secuid_col_index)
+        try:
+            follower_count = int(cell_value(row, follower_col_index).replace(',', '') or 0)
+        except ValueError:
+            follower_count = 0
+
+        if not sec_uid or not follower_count > 0:
+            logging.warning(f"Skipping user '{creator_name}' due to missing SecUid or follower count.")
+            continue
+        users_to_fetch.append((creator_name, sec_uid, cell_value(row, link_col_index), follower_count))
+
+    client = HTTP_CLIENT
+    results = await asyncio.gather(
+        *(fetch_user(client, creator_name, sec_uid) for creator_name, sec_uid, _, _ in users_to_fetch),
+        return_exceptions=True
+    )
+
+    for (creator_name, sec_uid, account_link, follower_count), videos in zip(users_to_fetch, results):
+        if isinstance(videos, Exception):
+            logging.error(f"Failed to process videos for user {sec_uid}: {videos}")
+            continue
+
+        if not videos:
+            continue
+
+        try:
+            # --- Virality Score Calculation (compiled kernel over this user's videos) ---
+            num_videos = len(videos)
+
+            def stat_column(key: str) -> np.ndarray:
+                return np.fromiter((video.get('statistics', {}).get(key, 0) for video in videos), dtype=np.float64, count=num_videos)
+
+            create_times = np.fromiter((video.get('create_time', current_time_ts) for video in videos), dtype=np.float64, count=num_videos)
+            final_virality_scores = virality_scores(
+                stat_column('digg_count'),
+                stat_column('comment_count'),
+                stat_column('share_count'),
+                stat_column('collect_count'),
+                stat_column('recommend_count'),
+                create_times,
+                float(current_time_ts),
+                W1,
+                W2,
+                math.log(follower_count + 1)
+            )
+
+            # --- Prepare data for the report rows ---
+            for video, final_virality_score in zip(videos, final_virality_scores.tolist()):
+                stats = video.get('statistics', {})
+                create_time = video.get('create_time', current_time_ts)
+                video_id = video.get('aweme_id')
+                # Columns follow REPORT_HEADERS
+                all_video_reports.append([
+                    creator_name,
+                    sec_uid,
+                    account_link,
+                    follower_count,
+                    video_id,
+                    f"https://www.douyin.com/video/{video_id}",
+                    video.get('desc'),
+                    create_time,
+                    time.strftime('%Y-%m-%d', time.gmtime(create_time)),
+                    stats.get('digg_count', 0),
+                    stats.get('comment_count', 0),
+                    stats.get('share_count', 0),
+                    stats.get('collect_count', 0),
+                    stats.get('recommend_count', 0),
+                    round(final_virality_score, 4)
+                ])
+        except Exception as e:
+            logging.error(f"Failed to process videos for user {sec_uid}: {e}")
 
     if not all_video_reports:
         raise HTTPException(status_code=404, detail="Could not fetch or process any videos for the selected users.")
 
     # Step 4: Sort the final report by Virality Score
-    all_video_reports.sort(key=lambda x: x['Virality Score'], reverse=True)
+    all_video_reports.sort(key=itemgetter(SCORE_COL), reverse=True)
 
     # Step 5: Create a new sheet and save the report
     try:
         report_sheet_title = f"VideoReport_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        report_worksheet = spreadsheet.add_worksheet(title=report_sheet_title, rows=len(all_video_reports) + 1, cols=len(all_video_reports[0]))
+        report_worksheet = await asyncio.to_thread(spreadsheet.add_worksheet, title=report_sheet_title, rows=len(all_video_reports) + 1, cols=len(REPORT_HEADERS))
         
-        headers = list(all_video_reports[0].keys())
-        sheet_rows = [list(row.values()) for row in all_video_reports]
+        sheet_body = [list(REPORT_HEADERS)] + all_video_reports
         
-        report_worksheet.update('A1', [headers])
-        report_worksheet.update('A2', sheet_rows)
+        # Headers and rows go out as one contiguous block in a single request
+        report_range = f"A1:{gspread.utils.rowcol_to_a1(len(sheet_body), len(REPORT_HEADERS))}"
+        await asyncio.to_thread(report_worksheet.update, range_name=report_range, values=sheet_body)
 
         report_sheet_url = f"https://docs.google.com/spreadsheets/d/{request.spreadsheet_id}/edit#gid={report_worksheet.id}"
         logging.info(f"Successfully created report sheet: {report_sheet_url}")
@@ -530,11 +776,11 @@ async def download_videos_to_drive(request: DownloadRequest):
 
     # Step 1: Create a new timestamped folder in Google Drive
     try:
-        drive_service = get_drive_service()
+        drive_service = await asyncio.to_thread(get_drive_service)
         folder_name = f"Downloaded_Videos_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
         logging.info(f"Creating new Drive folder '{folder_name}' inside parent '{request.parent_folder_id}'")
-        new_folder_info = create_drive_folder(drive_service, folder_name, request.parent_folder_id)
+        new_folder_info = await asyncio.to_thread(create_drive_folder, drive_service, folder_name, request.parent_folder_id)
         new_folder_id = new_folder_info["id"]
         new_folder_url = new_folder_info["link"]
     except HTTPException as e:
@@ -543,43 +789,54 @@ async def download_videos_to_drive(request: DownloadRequest):
         logging.error(f"Failed to create Google Drive folder: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to create Google Drive folder: {e}")
 
-    # Step 2: Loop through video IDs, download, and upload to the new folder
-    download_results = []
-    async with httpx.AsyncClient(timeout=300.0) as client:
-        for video_id in request.video_ids:
+    # Step 2: Download each video and upload it to the new folder, several at a time
+    VIDEO_SPOOL_MAX_BYTES = 16 * 1024 * 1024  # Videos larger than this spill to disk while downloading
+    sem = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+
+    async def process(client: httpx.AsyncClient, video_id: str) -> DownloadResult:
+        """Downloads a single video and uploads it to Drive, bounded by the shared semaphore."""
+        async with sem:
             try:
                 # Get the direct, no-watermark download link for the video
                 detail_payload = {"id": video_id}
                 logging.info(f"Fetching download details for video ID: {video_id}")
                 detail_response = await client.post(VIDEO_DETAIL_URL, json=detail_payload, headers=douyin_media_headers, timeout=45.0)
                 detail_response.raise_for_status()
-                detail_data = detail_response.json().get('aweme_detail', {})
+                detail_data = orjson.loads(detail_response.content).get('aweme_detail', {})
 
                 if not detail_data or 'video' not in detail_data or not detail_data['video']['play_addr']['url_list']:
                     raise ValueError("Download link not found in the API response.")
                 
                 downloadable_url = detail_data['video']['play_addr']['url_list'][0]
 
-                # Download the video content
+                # Stream the video content into a spooled temp file instead of holding it all in memory
                 logging.info(f"Downloading video content from URL for ID: {video_id}")
-                video_content_response = await client.get(downloadable_url, timeout=120.0)
-                video_content_response.raise_for_status()
-                video_content = video_content_response.content
+                with tempfile.SpooledTemporaryFile(max_size=VIDEO_SPOOL_MAX_BYTES) as video_file:
+                    async with client.stream('GET', downloadable_url, timeout=120.0) as video_content_response:
+                        video_content_response.raise_for_status()
+                        async for chunk in video_content_response.aiter_bytes():
+                            video_file.write(chunk)
+                    video_file.seek(0)
+
+                    # Upload the content to Google Drive on the upload executor so other downloads keep running
+                    video_name = f"douyin_{video_id}.mp4"
+                    drive_link = await asyncio.get_running_loop().run_in_executor(
+                        UPLOAD_EXECUTOR, upload_data_to_drive, drive_service, video_file, video_name, new_folder_id, 'video/mp4'
+                    )
                 
-                # Upload the content to Google Drive
-                video_name = f"douyin_{video_id}.mp4"
-                drive_link = upload_data_to_drive(drive_service, video_content, video_name, new_folder_id, 'video/mp4')
-                
-                download_results.append(DownloadResult(video_id=video_id, status="success", drive_link=drive_link))
                 logging.info(f"Successfully downloaded and uploaded video ID: {video_id}")
+                return DownloadResult(video_id=video_id, status="success", drive_link=drive_link)
 
             except Exception as e:
                 error_message = f"Failed to process video {video_id}: {e}"
                 logging.error(error_message)
-                download_results.append(DownloadResult(video_id=video_id, status="failed", error_detail=str(e)))
+                return DownloadResult(video_id=video_id, status="failed", error_detail=str(e))
+
+    client = HTTP_CLIENT
+    download_results = await asyncio.gather(*(process(client, video_id) for video_id in request.video_ids))
     
     return DownloadResponse(
         message="Video download process complete.",
         new_folder_url=new_folder_url,
-        download_results=download_results
+        download_results=list(download_results)
     )
\ No newline at end of file